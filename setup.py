@@ -26,6 +26,6 @@ setuptools.setup(
     install_requires=reqs,
     author_email='pji@mac.com',
     packages=setuptools.find_packages(),
-    python_requires='>=3.9',
+    python_requires='>=3.10',
     zip_safe=False
 )
@@ -4,8 +4,9 @@ __init__
 
 Initialization for the statuswriter module.
 """
+from statuswriter.spsc import Ring
 from statuswriter.statuswriter import (END, INIT, KILL, MSG,
                                        PROG, status_writer)
 
 
-__all__ = [END, INIT, KILL, MSG, PROG, status_writer,]
+__all__ = ['END', 'INIT', 'KILL', 'MSG', 'PROG', 'Ring', 'status_writer',]
@@ -0,0 +1,109 @@
+"""
+spsc
+~~~~
+
+A single-producer, single-consumer ring for passing commands to
+status_writer. Since status_writer has exactly one sender and one
+receiver, the ring can rely on CPython's global interpreter lock to
+keep its index updates atomic, avoiding the per-command locking of
+:class:queue.Queue.
+"""
+from queue import Empty, Full
+from threading import Event
+
+
+class Ring:
+    """A bounded single-producer, single-consumer queue.
+
+    The ring holds its items in a preallocated list. The producer
+    writes at the tail index and the consumer reads at the head
+    index, and each index is only ever advanced by its own thread,
+    so no lock is needed as long as there is exactly one producer
+    and one consumer. The consumer can block on an event until the
+    producer signals that an item is available.
+
+    The interface follows :class:queue.Queue closely enough that a
+    Ring can be passed to :func:statuswriter.status_writer as the
+    command queue.
+    """
+    __slots__ = ('_buf', '_size', '_head', '_tail', '_ready')
+
+    def __init__(self, size: int = 1024) -> None:
+        """Initialize an instance of the class.
+
+        :param size: (Optional.) The number of slots in the ring.
+            One slot is always left open to tell a full ring from an
+            empty one, so the ring holds size - 1 items.
+        :return: None.
+        :rtype: NoneType
+        """
+        self._buf: list = [None,] * size
+        self._size = size
+        self._head = 0
+        self._tail = 0
+        self._ready = Event()
+
+    def empty(self) -> bool:
+        """Whether the ring has no items waiting.
+
+        :return: A :class:bool object.
+        :rtype: bool
+        """
+        return self._head == self._tail
+
+    def put(self, item) -> None:
+        """Add an item to the ring.
+
+        :param item: The item to add.
+        :return: None.
+        :rtype: NoneType
+        """
+        tail = self._tail
+        next_tail = (tail + 1) % self._size
+        if next_tail == self._head:
+            raise Full
+        self._buf[tail] = item
+        self._tail = next_tail
+        self._ready.set()
+
+    # queue.Queue puts can block when the queue is full. The ring
+    # never blocks the producer, so put_nowait is just put.
+    put_nowait = put
+
+    def get(self, timeout: float | None = None):
+        """Remove and return the oldest item in the ring, waiting
+        for one to arrive if the ring is empty.
+
+        :param timeout: (Optional.) How many seconds to wait for an
+            item before raising :class:queue.Empty. If None, wait
+            forever.
+        :return: The oldest item in the ring.
+        """
+        while True:
+            try:
+                return self.get_nowait()
+            except Empty:
+                pass
+
+            # The producer may have put an item between the check
+            # above and the clear, so check again before waiting on
+            # the event.
+            self._ready.clear()
+            if self._head != self._tail:
+                continue
+            if not self._ready.wait(timeout):
+                raise Empty
+
+    def get_nowait(self):
+        """Remove and return the oldest item in the ring, raising
+        :class:queue.Empty if the ring is empty.
+
+        :return: The oldest item in the ring.
+        """
+        head = self._head
+        if head == self._tail:
+            raise Empty
+        item = self._buf[head]
+        self._buf[head] = None
+        self._head = (head + 1) % self._size
+        return item
@@ -4,17 +4,30 @@ statuswriter
 
 A module for writing basic status updates to a command line interface.
 """
-from collections import deque
-from queue import Queue
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import lru_cache
+import io
+from queue import Empty, Queue, SimpleQueue
 import sys
-from textwrap import wrap
+from textwrap import TextWrapper
 import time
 
+from statuswriter.spsc import Ring
+
 
 # Terminal control codes used to move the location of the cursor.
 LN_UP = '\033[A'
 LN_DOWN = '\n'
 
+# Terminal control code that clears from the cursor to the end of
+# the screen.
+CLR_EOS = '\033[J'
+
+# Terminal control codes that save and restore the cursor position.
+CUR_SAVE = '\0337'
+CUR_REST = '\0338'
+
 # Terminal configuration.
 TERMINAL_WIDTH = 79
 
@@ -25,29 +38,129 @@ PROG = 0x2
 KILL = 0xe
 END = 0xf
 
-# Message templates.
-PREFIX_TEMPLATE = '{h:02d}:{m:02d}:{s:02d} '
-MSG_TEMPLATE = '{prefix}{msg}'
+# Shortcuts for functions that write to the terminal. When stdout is
+# an interactive terminal, CPython line-buffers it, so every newline
+# in a repaint becomes its own system call. Wrapping the underlying
+# binary buffer in a block-buffered writer keeps each repaint to one
+# system call, with the explicit flush() calls as the commit points.
+# Not every stdout has a binary buffer (it may have been replaced by
+# something like a StringIO), so fall back to stdout itself.
+try:
+    _stdout = io.TextIOWrapper(
+        sys.stdout.buffer,
+        encoding=sys.stdout.encoding,
+        line_buffering=False,
+    )
+except AttributeError:
+    _stdout = sys.stdout
+write, flush = _stdout.write, _stdout.flush
 
-# Shortcuts for functions that write to the terminal.
-write, flush = sys.stdout.write, sys.stdout.flush
+# Whether stdout is an interactive terminal. When it isn't, the
+# cursor control codes would just be garbage bytes in the output, so
+# the writer falls back to plain lines and doesn't repaint.
+_IS_TTY = sys.stdout.isatty()
 
 
 # Utility functions.
-def make_progress_frame(total: int) -> tuple[str, str, str]:
-    """Create the strings for the initial state of the progress bar.
+@lru_cache(maxsize=32)
+def make_progress_frame(total: int) -> tuple[str, str]:
+    """Create the top and bottom of the frame around the progress
+    bar. The bar itself is built by :func:_bar_line, which owns the
+    middle of the frame.
 
     :param total: The total number of steps needed to complete the
         monitored application.
     :return: A :class:tuple object.
     :rtype: tuple
     """
-    lines = (
-        ('\u250c', ' ', '\u2510',),
-        ('\u2502', '\u2591', '\u2502',),
-        ('\u2514', ' ', '\u2518'),
+    rail = '\u2500' * total
+    return (
+        f'\u250c{rail}\u2510',
+        f'\u2514{rail}\u2518',
     )
-    return tuple(f'{line[0]}{line[1] * total}{line[2]}' for line in lines)
+
+
+@lru_cache(maxsize=16)
+def _get_wrapper(width: int, hang_indent: int) -> TextWrapper:
+    """Create the wrapper used to wrap long messages.
+
+    :param width: The number of fixed-width characters that can fit
+        in a single line in the terminal.
+    :param hang_indent: The number of spaces to indent wrapped lines.
+    :return: A :class:textwrap.TextWrapper object.
+    :rtype: textwrap.TextWrapper
+    """
+    return TextWrapper(width=width, subsequent_indent=' ' * hang_indent)
+
+
+@lru_cache(maxsize=256)
+def _wrap_lines(msg: str, width: int, hang_indent: int) -> tuple[str, ...]:
+    """Wrap a long message into lines that fit in the terminal.
+    Messages often repeat, so the wrapped lines are cached to keep
+    from paying for the wrapping machinery more than once per
+    message.
+
+    :param msg: The message to wrap.
+    :param width: The number of fixed-width characters that can fit
+        in a single line in the terminal.
+    :param hang_indent: The number of spaces to indent wrapped lines.
+    :return: A :class:tuple object.
+    :rtype: tuple
+    """
+    return tuple(_get_wrapper(width, hang_indent).wrap(msg))
+
+
+@lru_cache(maxsize=32)
+def _bar_buffers(total: int) -> tuple[str, str]:
+    """Create the fully complete and fully incomplete bars for a
+    progress bar of the given size.
+
+    :param total: The total number of steps needed to complete the
+        monitored application.
+    :return: A :class:tuple object.
+    :rtype: tuple
+    """
+    return '█' * total, '░' * total
+
+
+@lru_cache(maxsize=32)
+def _bar_line(total: int, complete: int) -> str:
+    """Create the middle line of the progress bar with the given
+    number of steps complete.
+
+    :param total: The total number of steps needed to complete the
+        monitored application.
+    :param complete: The number of steps that have been completed.
+    :return: A :class:str object.
+    :rtype: str
+    """
+    full, empty = _bar_buffers(total)
+    return f'│{full[:complete]}{empty[complete:]}│'
+
+
+@lru_cache(maxsize=16)
+def _clear_seq(size: int) -> str:
+    """Create the control sequence that moves the cursor to the top
+    of a message area of the given size and clears it.
+
+    :param size: The number of lines in the message area.
+    :return: A :class:str object.
+    :rtype: str
+    """
+    return f'\r{LN_UP * size}{CLR_EOS}'
+
+
+@lru_cache(maxsize=16)
+def _move_to_bar(lines: int) -> str:
+    """Create the control sequence that saves the cursor position and
+    moves to the middle line of the progress bar.
+
+    :param lines: How far below the bottom of the progress bar frame
+        the cursor is located.
+    :return: A :class:str object.
+    :rtype: str
+    """
+    return CUR_SAVE + LN_UP * (lines + 2) + '\r'
 
 
 def split_time(duration: float) -> tuple[int, int, int]:
@@ -58,21 +171,27 @@ def split_time(duration: float) -> tuple[int, int, int]:
     :return: A :class:tuple object.
     :rtype: tuple
     """
-    s = duration % 60
-    duration -= s
-    m = duration % 3600
-    duration -= m
-    h = int(duration / 3600)
-    m = int(m / 60)
-    s = int(s)
+    m, s = divmod(int(duration), 60)
+    h, m = divmod(m, 60)
     return h, m, s
 
 
-def timer() -> float:
-    """A simple generator for timing a process."""
-    t0 = time.time()
-    while True:
-        yield time.time() - t0
+def timer() -> Callable[[], int]:
+    """A simple timer for timing a process. The returned callable
+    gives the number of whole seconds since timer() was called. The
+    time comes from the monotonic nanosecond clock, so it isn't
+    affected by changes to the system clock while the process runs
+    and the arithmetic stays in integers.
+
+    :return: A :class:collections.abc.Callable object.
+    :rtype: collections.abc.Callable
+    """
+    t0 = time.monotonic_ns()
+
+    def elapsed() -> int:
+        return (time.monotonic_ns() - t0) // 1_000_000_000
+
+    return elapsed
 
 
 def update_progress(total: int, complete: int, lines:int = 0) -> None:
@@ -88,138 +207,214 @@ def update_progress(total: int, complete: int, lines:int = 0) -> None:
     :return: None.
     :rtype: NoneType
     """
-    incomplete = total - complete
-    bar = '\u2588' * complete + '\u2591' * incomplete
-    frame_with_bar = f'\u2502{bar}\u2502'
-
+    frame_with_bar = _bar_line(total, complete)
+
+    # Without a terminal there is no frame to move back to, so just
+    # write the bar as a plain line.
+    if not _IS_TTY:
+        write(f'{frame_with_bar}\n')
+        return
+
+    # Send the update as a single write to keep the cost of the
+    # write call from growing with the size of the display. The
+    # cursor position is saved before moving to the bar and restored
+    # after, so the return trip is a fixed two bytes rather than a
+    # run of line feeds that grows with the message area.
     if lines:
-        write(LN_UP * (lines + 2) + '\r')
+        frame_with_bar = _move_to_bar(lines) + frame_with_bar + CUR_REST
     write(frame_with_bar)
-    if lines:
-        write(LN_DOWN * (lines + 2) + '\r')
 
 
-def update_status(msgs: deque,
+def update_status(msgs: list,
+                  head: int,
                   new_msg: str,
-                  maxlines: int = 4,
-                  hang_indent: int = 0) -> None:
+                  hang_indent: int = 0,
+                  overlay: bool = False,
+                  dedupe: bool = False) -> int:
     """Update the status messages.
 
-    :param msgs: The messages currently displayed in the terminal.
+    :param msgs: The messages currently displayed in the terminal,
+        stored as a ring buffer. Each line of the display is a slot
+        in the list, and the oldest displayed line is at the index
+        given by head.
+    :param head: The index of the oldest displayed line in msgs. New
+        lines overwrite the oldest line, so this is also where the
+        next line is written.
     :param new_msg: The new message to display.
-    :param maxlines: (Optional.) The number of lines to display in the
-        terminal. This isn't exactly the number of messages because
-        long messages can wrap into multiple lines.
-    :param term_width: (Optional.) The number of fixed-width characters
-        that can fit in a single line in the terminal. Messages longer
-        than this are wrapped into multiple lines.
     :param hang_indent: (Optional.) The number of spaces to indent
         wrapped lines.
-    :return: None.
-    :rtype: NoneType
+    :param overlay: (Optional.) Display the new message without
+        adding it to the ring. The display rolls as if the message
+        had been added, but the ring is left untouched, so the next
+        real message replaces the overlaid one. This is used for
+        transient messages like the waiting message.
+    :param dedupe: (Optional.) Skip the update entirely when the new
+        message matches the newest displayed line. Useful for
+        callers that repeat the same message at a high rate, like
+        heartbeats.
+    :return: The new index of the oldest displayed line, as an
+        :class:int.
+    :rtype: int
     """
-    # Clear old messages. Deques don't support standard slicing, so
-    # having to loop through the indices rather than the deque.
-    for i in range(len(msgs))[::-1]:
-        try:
-            write(f'\r{LN_UP}' + ' ' * len(msgs[i]))
-        except TypeError as e:
-            print(msgs)
-            raise e
-
-    # Add the new message to the message queue and roll off old
-    # messages.
-    indent = ' ' * hang_indent
-    new_lines = wrap(new_msg, TERMINAL_WIDTH, subsequent_indent=indent)
-    for line in new_lines:
-        msgs.append(line)
-    while len(msgs) > maxlines:
-        msgs.popleft()
-
-    # Write the remaining messages to the terminal
-    for msg in msgs:
-        write(f'\r{msg}\n')
+    # A duplicate of the newest line would repaint the display with
+    # the same bytes, so skip it when the caller opted in.
+    if dedupe and new_msg == msgs[head - 1]:
+        return head
+    # Build the update as a single string so the whole display can be
+    # sent to the terminal with one write call. The terminal width is
+    # read from the module once at entry; a local is cheaper for
+    # CPython to resolve than a module global.
+    size = len(msgs)
+    width = TERMINAL_WIDTH
+    parts = []
+
+    # Clear old messages by moving the cursor back to the top of the
+    # message area and erasing to the end of the screen. Without a
+    # terminal there is nothing to clear, and the cursor codes would
+    # be garbage in the output.
+    if _IS_TTY:
+        parts.append(_clear_seq(size))
+
+    # Add the new message to the ring, rolling over the oldest
+    # messages. Most messages fit on one line, so only pay for the
+    # wrapping machinery when the message is too long to fit. An
+    # overlaid message is only rendered, never stored, so the ring
+    # keeps the real messages.
+    if len(new_msg) <= width and '\n' not in new_msg:
+        new_lines = (new_msg,)
+    else:
+        new_lines = _wrap_lines(new_msg, width, hang_indent)
+    if overlay:
+        display = (msgs[head:] + msgs[:head])[len(new_lines):]
+        display += list(new_lines)
+    else:
+        for line in new_lines:
+            msgs[head] = line
+            head = (head + 1) % size
+        display = msgs[head:] + msgs[:head]
+
+    # Write the messages back to the terminal. Without a terminal,
+    # only the new lines are written, as plain lines.
+    if _IS_TTY:
+        for msg in display:
+            parts.append(f'\r{msg}\n')
+    else:
+        for msg in new_lines:
+            parts.append(f'{msg}\n')
+    write(''.join(parts))
+    return head
+
+
+# Writer state.
+@dataclass(slots=True)
+class _State:
+    """The state of a running status_writer."""
+    title: str = ''
+    stages: int = 0
+    stages_complete: int = 0
+    maxlines: int = 4
+    msgs: list = field(default_factory=list)
+    head: int = 0
+    is_running: bool = False
+    t0: float = field(default_factory=lambda: time.monotonic())
+    prev_sec: int = -1
+    prev_prefix: str = ''
+    last_waiting_prefix: str = ''
+
+
+def _prefix(state: _State) -> str:
+    """Return the time prefix for the current second. The prefix only
+    changes once a second, so the last formatted prefix is cached on
+    the state and only rebuilt when the second ticks over.
+    """
+    sec = int(time.monotonic() - state.t0)
+    if sec != state.prev_sec:
+        # The divmod chain from split_time is inlined here to skip
+        # a function call on the render path.
+        m, s = divmod(sec, 60)
+        h, m = divmod(m, 60)
+        state.prev_prefix = f'{h:02d}:{m:02d}:{s:02d} '
+        state.prev_sec = sec
+    return state.prev_prefix
 
 
 # Command functions.
-def _init(msgs: deque,
-          title: str,
-          stages: int,
-          maxlines: int,
-          timer_: timer) -> None:
+def _init(state: _State, args: tuple) -> None:
     """Write the initial status display."""
-    # Write the title.
-    write(f'{title}\n')
+    # The whole initial display is built up and sent as one write.
+    # Start with the title.
+    parts = [f'{state.title}\n']
 
     # Set up the progress bar.
-    if stages:
-        prog_bar = make_progress_frame(stages)
-        for line in prog_bar:
-            write(f'{line}\n')
+    if state.stages:
+        top, bottom = make_progress_frame(state.stages)
+        parts.append(f'{top}\n{_bar_line(state.stages, 0)}\n{bottom}\n')
 
     # Set up the messages.
-    if maxlines:
-        h, m, s = split_time(next(timer_))
-        prefix = PREFIX_TEMPLATE.format(h=h, m=m, s=s)
-        new_msg = MSG_TEMPLATE.format(prefix=prefix, msg='Starting...')
-        msgs.append(new_msg)
-        for line in msgs:
-            write(f'{line}\n')
+    if state.maxlines:
+        new_msg = f'{_prefix(state)}Starting...'
+        msgs = state.msgs
+        msgs[state.head] = new_msg
+        state.head = (state.head + 1) % state.maxlines
+        for line in msgs[state.head:] + msgs[:state.head]:
+            parts.append(f'{line}\n')
 
     # Finish the initialization.
+    write(''.join(parts))
     flush()
+    state.is_running = True
 
 
-def _kill(msgs: deque, ex: Exception, maxlines: int, timer_: timer) -> None:
+def _kill(state: _State, args: tuple) -> None:
     """Write an exception to the status display."""
-    h, m, s = split_time(next(timer_))
-    prefix = PREFIX_TEMPLATE.format(h=h, m=m, s=s)
-    new_msg = MSG_TEMPLATE.format(prefix=prefix, msg='Aborting...')
-    update_status(msgs, new_msg, maxlines)
+    new_msg = f'{_prefix(state)}Aborting...'
+    update_status(state.msgs, state.head, new_msg)
     flush()
-    raise ex
+    raise args[0]
 
 
-def _msg(msgs: deque,
-         msg: str,
-         maxlines: int,
-         timer_: timer,
-         was_waiting: str) -> None:
+def _msg(state: _State, args: tuple) -> None:
     """Write a message to the status display."""
     # If the writer was not configured to write messages,
     # there is no place to put them.
-    if not maxlines:
+    if not state.maxlines:
         msg = 'Not configured to allow messages.'
         raise ValueError(msg)
 
-    # If the writer has been waiting for an update, remove
-    # the waiting message so it doesn't stay in the
-    # display, and add the old top message back into the
-    # deque to prevent problems when update_status() rolls
-    # the messages.
-    if was_waiting:
-        msgs.pop()
-        msgs.appendleft(was_waiting)
-
-    # Display the message.
-    h, m, s = split_time(next(timer_))
-    prefix = PREFIX_TEMPLATE.format(h=h, m=m, s=s)
-    new_msg = MSG_TEMPLATE.format(prefix=prefix, msg=msg)
-    update_status(msgs, new_msg, maxlines, len(prefix))
+    # Display the message. Since a waiting message is only ever
+    # overlaid on the display and never stored in the ring, this
+    # replaces any waiting message on screen. Clearing the saved
+    # waiting prefix makes sure the next wait repaints.
+    prefix = _prefix(state)
+    new_msg = f'{prefix}{args[0]}'
+    state.head = update_status(state.msgs, state.head, new_msg, len(prefix))
+    state.last_waiting_prefix = ''
     flush()
 
 
-def _prog(stages: int, stages_complete: int, maxlines: int) -> None:
+def _prog(state: _State, args: tuple) -> None:
     """Advance the progress bar."""
-    if not stages:
+    if not state.stages:
         msg = 'Not configured to show a progress bar.'
         raise ValueError(msg)
-    update_progress(stages, stages_complete, maxlines)
+    state.stages_complete += 1
+    update_progress(state.stages, state.stages_complete, state.maxlines)
     flush()
 
 
+# Commands are dispatched through a table indexed by command code,
+# so finding a handler is a single subscript with no hashing. The
+# codes are small ints, so the table is a sixteen-slot tuple with
+# None in the unused slots. END is handled in the application loop
+# itself since it has to break out of it.
+_HANDLERS = tuple(
+    {INIT: _init, MSG: _msg, PROG: _prog, KILL: _kill}.get(code)
+    for code in range(16)
+)
+
+
 # Public function.
-def status_writer(cmd_queue: Queue,
+def status_writer(cmd_queue: Queue | SimpleQueue | Ring,
                   title: str,
                   stages: int = 0,
                   maxlines: int = 4,
@@ -230,7 +425,11 @@ def status_writer(cmd_queue: Queue,
     :param cmd_queue: A queue used to pass commands to the coroutine.
         Commands are passed as a tuple that contains a command code
         and command arguments. See the table below for the list of
-        command codes and arguments.
+        command codes and arguments. Since there is only one sender
+        and one receiver, a :class:queue.SimpleQueue has less locking
+        overhead per command than a :class:queue.Queue, and a
+        :class:statuswriter.spsc.Ring has none at all, but all three
+        work.
     :param stages: (Optional.) The number of steps the program will
         complete before it is done. This is used to determine the size
         of the progress bar. If this is zero, the progress bar will
@@ -265,88 +464,97 @@ def status_writer(cmd_queue: Queue,
 
     For usage examples, see the example scripts.
     """
-    timer_ = timer()
-
-    # Basic configuration for the progress bar.
-    stages_complete = 0
-
-    # Basic configuration for messages. We are priming msgs with lines
-    # that contain a space so that later we can tell the difference
-    # between these primed lines and a false value in was_waiting when
-    # trying to determine whether the bottom message in the status
-    # display is a waiting message.
-    msgs = deque()
-    for _ in range(maxlines - 1):
-        msgs.append(' ')
-
-    # Flags that allow the writer to monitor its state.
-    is_running = False
-    was_waiting = ''
+    # The state of the writer. The message slots are primed with a
+    # space so the initial display has blank lines to roll off. The
+    # KILL handler aborts the display when an exception is caught in
+    # the monitored application, and displays the trace of that
+    # exception. This is needed because status_writer runs in a
+    # separate thread from the application, so it will overwrite the
+    # trace printed by the monitored application. It only works if
+    # the monitored application catches the exception and sends it
+    # to status_writer with the KILL command code.
+    state = _State(
+        title=title,
+        stages=stages,
+        maxlines=maxlines,
+        msgs=[' ',] * maxlines,
+    )
 
-    # The application loop.
+    # Without a terminal, repainting the waiting message would just
+    # spam the output, so disable the refresh.
+    if not _IS_TTY:
+        refresh = 0
+
+    # The application loop. Block on the command queue rather than
+    # polling it, so the writer uses no CPU while it's idle. The wait
+    # only times out once a refresh rate was given and the display is
+    # up, since that's the only time the waiting message needs to be
+    # updated. Names the loop uses on every pass are bound to locals
+    # at entry to avoid repeated global lookups.
+    get = cmd_queue.get
+    get_nowait = cmd_queue.get_nowait
+    handlers = _HANDLERS
+    pending = None
     while True:
-        if not cmd_queue.empty():
-            cmd, *args = cmd_queue.get()
-
-            # Initialize the status display in the terminal.
-            if cmd == INIT:
-                _init(msgs, title, stages, maxlines, timer_)
-                is_running = True
-
-            # Write a status message to the status display.
-            elif cmd == MSG:
-                _msg(msgs, args[0], maxlines, timer_, was_waiting)
-                was_waiting = ''
-
-            # Advance the progress bar.
-            elif cmd == PROG:
-                stages_complete += 1
-                _prog(stages, stages_complete, maxlines)
-
-            # Abort the status display when an exception is caught in
-            # the monitored application, and display the trace of that
-            # exception. This is needed because status_writer runs in
-            # a separate thread from the application, so it will
-            # overwrite the trace printed by the monitored application.
-            # It only works if the monitored application catches the
-            # exception and sends it to status_writer the the KILL
-            # command code.
-            elif cmd == KILL:
-                _kill(msgs, args[0], maxlines, timer_)
+        try:
+            if pending is not None:
+                cmd, *args = pending
+                pending = None
+            elif refresh and state.is_running and maxlines:
+                cmd, *args = get(timeout=refresh)
+            else:
+                cmd, *args = get()
+
+            # A producer advancing the bar in a tight loop would
+            # otherwise repaint the bar once per step, so bursts of
+            # PROG commands are coalesced into a single repaint. The
+            # drain is capped to bound the latency of any command
+            # queued behind the burst, and the first command that
+            # isn't a PROG is held for the next pass of the loop.
+            if cmd == PROG:
+                extra = 0
+                while extra < 255:
+                    try:
+                        nxt = get_nowait()
+                    except Empty:
+                        break
+                    if nxt[0] == PROG:
+                        extra += 1
+                    else:
+                        pending = nxt
+                        break
+                state.stages_complete += extra
 
             # Terminate the status_writer.
-            elif cmd == END:
+            if cmd == END:
                 break
 
-            # Raise an exception if an unknown command is received.
-            else:
+            # Dispatch the command, raising an exception if an
+            # unknown command is received.
+            try:
+                handler = handlers[cmd]
+            except (IndexError, TypeError):
+                handler = None
+            if handler is None:
                 msg = f'Command {cmd} not recognized.'
                 raise ValueError(msg)
+            handler(state, args)
 
         # Update the status messages periodically to let the user
         # know how long as elapsed since the monitored application
         # began.
-        elif refresh and is_running and maxlines:
-            time.sleep(refresh)
-
-            # If the writer has been waiting for an update, there is
-            # already a waiting line in the message deque. Remove it
-            # and add back the old top message to make sure the
-            # messages roll well.
-            if was_waiting:
-                msgs.pop()
-                msgs.appendleft(was_waiting)
-
-            # If we are adding a waiting message to the deque, we need
-            # to store the top message in the deque that will roll off
-            # due to the waiting message. Otherwise, update_status()
-            # won't roll the messages properly.
-            else:
-                was_waiting = msgs[0]
-
-            # Display the waiting message.
-            h, m, s = split_time(next(timer_))
-            prefix = PREFIX_TEMPLATE.format(h=h, m=m, s=s)
-            new_msg = MSG_TEMPLATE.format(prefix=prefix, msg='Waiting...')
-            update_status(msgs, new_msg, maxlines)
+        except Empty:
+            # If the waiting message is already displayed and the
+            # time on it hasn't ticked over, repainting it would
+            # write the same bytes to the terminal again. Skip it.
+            prefix = _prefix(state)
+            if prefix == state.last_waiting_prefix:
+                continue
+
+            # Overlay the waiting message on the display. The ring
+            # itself is left untouched, so the next real message
+            # rolls over the waiting message naturally.
+            new_msg = f'{prefix}Waiting...'
+            update_status(state.msgs, state.head, new_msg, overlay=True)
             flush()
+            state.last_waiting_prefix = prefix
@@ -0,0 +1,126 @@
+"""
+test_spsc
+~~~~~~~~~
+
+Unit tests for the statuswriter.spsc module.
+"""
+from queue import Empty, Full
+import unittest as ut
+from unittest.mock import call, patch
+
+from statuswriter import spsc
+from statuswriter import statuswriter as sw
+
+
+# Test classes.
+class RingTestCase(ut.TestCase):
+    def test_put_and_get(self):
+        """Items put into the ring should come back out of the ring
+        in the order they were put in.
+        """
+        # Expected value.
+        exp = [
+            (sw.MSG, 'spam'),
+            (sw.MSG, 'eggs'),
+            (sw.END,),
+        ]
+
+        # Set up test data and state.
+        ring = spsc.Ring()
+        for item in exp:
+            ring.put(item)
+
+        # Run test.
+        act = [ring.get() for _ in exp]
+
+        # Determine if test passed.
+        self.assertListEqual(exp, act)
+
+    def test_get_empty(self):
+        """If the ring is empty and the wait times out, get should
+        raise an Empty exception.
+        """
+        # Expected value.
+        exp_exception = Empty
+
+        # Set up test data and state.
+        ring = spsc.Ring()
+
+        # Will determine if test passed.
+        with self.assertRaises(exp_exception):
+
+            # Run test.
+            _ = ring.get(timeout=0.01)
+
+    def test_get_nowait_empty(self):
+        """If the ring is empty, get_nowait should raise an Empty
+        exception without waiting.
+        """
+        # Expected value.
+        exp_exception = Empty
+
+        # Set up test data and state.
+        ring = spsc.Ring()
+
+        # Will determine if test passed.
+        with self.assertRaises(exp_exception):
+
+            # Run test.
+            _ = ring.get_nowait()
+
+    def test_put_full(self):
+        """If the ring is full, put should raise a Full exception
+        rather than block the producer.
+        """
+        # Expected value.
+        exp_exception = Full
+
+        # Set up test data and state.
+        ring = spsc.Ring(size=4)
+        for item in range(3):
+            ring.put(item)
+
+        # Will determine if test passed.
+        with self.assertRaises(exp_exception):
+
+            # Run test.
+            ring.put(3)
+
+    @patch('statuswriter.statuswriter.write')
+    @patch('statuswriter.statuswriter.flush')
+    @patch('time.monotonic', return_value=1000)
+    def test_drives_status_writer(self, _, __, mock_write):
+        """A Ring should work as the command queue for
+        status_writer.
+        """
+        # Expected value.
+        exp = [
+            call(
+                'SPAM: the Eggening\n'
+                + '┌──────┐\n│░░░░░░│\n└──────┘\n'
+                + ' \n'
+                + '00:00:00 Starting...\n'
+            ),
+        ]
+
+        # Set up test data and state.
+        is_tty_bkp = sw._IS_TTY
+        sw._IS_TTY = True
+        try:
+            ring = spsc.Ring()
+            ring.put((sw.INIT,))
+            ring.put((sw.END,))
+            title = 'SPAM: the Eggening'
+            stages = 6
+            maxlines = 2
+
+            # Run test.
+            _ = sw.status_writer(ring, title, stages, maxlines)
+        finally:
+            sw._IS_TTY = is_tty_bkp
+
+        # Extract actual result.
+        act = mock_write.mock_calls
+
+        # Determine if test passed.
+        self.assertListEqual(exp, act)
@@ -4,7 +4,6 @@ test_statuswriter
 
 Unit tests for the statuswriter.statuswriter module.
 """
-from collections import deque
 from queue import Queue
 import unittest as ut
 from unittest.mock import call, patch
@@ -17,14 +16,12 @@ class MakeProgressFrameTestCase(ut.TestCase):
     def test_make_frame(self):
         """Given the total number of progress steps,
         make_progress_frame should return a tuple that
-        contains the top, middle, and bottom of the
-        progress frame.
+        contains the top and bottom of the progress frame.
         """
         # Expected value.
         exp = (
-            '┌      ┐',
-            '│░░░░░░│',
-            '└      ┘',
+            '┌──────┐',
+            '└──────┘',
         )
 
         # Set up test data and state.
@@ -57,29 +54,39 @@ class SplitTimeTestCase(ut.TestCase):
 
 
 class StatusWriter(ut.TestCase):
-    def setUp(self):
-        self.title = 'SPAM: the Eggening'
-        self.progress_frame = (
-            '┌      ┐',
+    @classmethod
+    def setUpClass(cls):
+        # These fixtures are static, so they are built once for the
+        # class rather than once per test.
+        cls.title = 'SPAM: the Eggening'
+        cls.progress_frame = (
+            '┌──────┐',
             '│░░░░░░│',
-            '└      ┘',
+            '└──────┘',
         )
-        self.msg_tmp = '{:02d}:{:02d}:{:02d} {}'
-        self.init_write_calls = [
-            call(self.title + '\n'),
-            call(self.progress_frame[0] + '\n'),
-            call(self.progress_frame[1] + '\n'),
-            call(self.progress_frame[2] + '\n'),
-            call(' \n'),
-            call(self.msg_tmp.format(0, 0, 0, 'Starting...') + '\n'),
-        ]
-        self.init_flush_calls = [
+        cls.msg_tmp = '{:02d}:{:02d}:{:02d} {}'
+        cls.init_parts = [
+            cls.title + '\n',
+            '\n'.join(cls.progress_frame) + '\n',
+            ' \n' + cls.msg_tmp.format(0, 0, 0, 'Starting...') + '\n',
+        ]
+        cls.init_write_calls = [
+            call(''.join(cls.init_parts)),
+        ]
+        cls.init_flush_calls = [
             call(),
         ]
 
+    def setUp(self):
+        self._IS_TTY_bkp = sw._IS_TTY
+        sw._IS_TTY = True
+
+    def tearDown(self):
+        sw._IS_TTY = self._IS_TTY_bkp
+
     @patch('statuswriter.statuswriter.write')
     @patch('statuswriter.statuswriter.flush')
-    @patch('time.time', return_value=1000)
+    @patch('time.monotonic', return_value=1000)
     def test_initialize(self, _, mock_flush, mock_write):
         """Given a deque for messages, a title and a maximum number of
         messages to display, status_writer should write the initial
@@ -110,7 +117,7 @@ class StatusWriter(ut.TestCase):
 
     @patch('statuswriter.statuswriter.write')
     @patch('statuswriter.statuswriter.flush')
-    @patch('time.time', return_value=1000)
+    @patch('time.monotonic', return_value=1000)
     def test_initialize_without_progress(self, _, mock_flush, mock_write):
         """Given a deque for messages, a title and a maximum number of
         messages to display, but no progress stages, status_writer
@@ -119,8 +126,7 @@ class StatusWriter(ut.TestCase):
         """
         # Expected value.
         exp_write = [
-            self.init_write_calls[0],
-            *self.init_write_calls[4:],
+            call(self.init_parts[0] + self.init_parts[2]),
         ]
         exp_flush = self.init_flush_calls
 
@@ -144,14 +150,16 @@ class StatusWriter(ut.TestCase):
 
     @patch('statuswriter.statuswriter.write')
     @patch('statuswriter.statuswriter.flush')
-    @patch('time.time', return_value=1000)
+    @patch('time.monotonic', return_value=1000)
     def test_initialize_without_messages(self, _, mock_flush, mock_write):
         """Given a deque for messages, a title and a number of progres
         stages, but no progress stages, status_writer should write the
         initial status display to the terminal without a progress bar.
         """
         # Expected value.
-        exp_write = self.init_write_calls[:4]
+        exp_write = [
+            call(''.join(self.init_parts[:2])),
+        ]
         exp_flush = self.init_flush_calls
 
         # Set up test data and status.
@@ -175,7 +183,7 @@ class StatusWriter(ut.TestCase):
 
     @patch('statuswriter.statuswriter.write')
     @patch('statuswriter.statuswriter.flush')
-    @patch('time.time', side_effect=[1000, 1000, 4661, 4661])
+    @patch('time.monotonic', side_effect=[1000, 1000, 4661])
     def test_kill(self, _, mock_flush, mock_write):
         """When a message command is sent to the message queue, the
         message should be written to the terminal.
@@ -183,10 +191,11 @@ class StatusWriter(ut.TestCase):
         # Expected value.
         exp_write = [
             *self.init_write_calls,
-            call('\r\033[A' + ' ' * 20),
-            call('\r\033[A' + ' '),
-            call('\r' + self.msg_tmp.format(0, 0, 0, 'Starting...') + '\n'),
-            call('\r' + self.msg_tmp.format(1, 1, 1, 'Aborting...') + '\n')
+            call(
+                '\r' + '\033[A' * 2 + '\033[J'
+                + '\r' + self.msg_tmp.format(0, 0, 0, 'Starting...') + '\n'
+                + '\r' + self.msg_tmp.format(1, 1, 1, 'Aborting...') + '\n'
+            ),
         ]
         exp_flush = [
             *self.init_flush_calls,
@@ -218,7 +227,7 @@ class StatusWriter(ut.TestCase):
 
     @patch('statuswriter.statuswriter.write')
     @patch('statuswriter.statuswriter.flush')
-    @patch('time.time', side_effect=[1000, 1000, 4661, 4661])
+    @patch('time.monotonic', side_effect=[1000, 1000, 4661])
     def test_message(self, _, mock_flush, mock_write):
         """When a message command is sent to the message queue, the
         message should be written to the terminal.
@@ -226,10 +235,11 @@ class StatusWriter(ut.TestCase):
         # Expected value.
         exp_write = [
             *self.init_write_calls,
-            call('\r\033[A' + ' ' * 20),
-            call('\r\033[A' + ' '),
-            call('\r' + self.msg_tmp.format(0, 0, 0, 'Starting...') + '\n'),
-            call('\r' + self.msg_tmp.format(1, 1, 1, 'bacon') + '\n')
+            call(
+                '\r' + '\033[A' * 2 + '\033[J'
+                + '\r' + self.msg_tmp.format(0, 0, 0, 'Starting...') + '\n'
+                + '\r' + self.msg_tmp.format(1, 1, 1, 'bacon') + '\n'
+            ),
         ]
         exp_flush = [
             *self.init_flush_calls,
@@ -283,7 +293,7 @@ class StatusWriter(ut.TestCase):
 
     @patch('statuswriter.statuswriter.write')
     @patch('statuswriter.statuswriter.flush')
-    @patch('time.time', return_value=1000)
+    @patch('time.monotonic', return_value=1000)
     def test_progress(self, _, mock_flush, mock_write):
         """When a progress command is sent to the message queue, the
         progress bar should be updated in the terminal
@@ -291,9 +301,45 @@ class StatusWriter(ut.TestCase):
         # Expected value.
         exp_write = [
             *self.init_write_calls,
-            call('\033[A\033[A\033[A\033[A\r'),
-            call('│█░░░░░│'),
-            call('\n\n\n\n\r'),
+            call('\0337' + '\033[A' * 4 + '\r' + '│█░░░░░│' + '\0338'),
+        ]
+        exp_flush = [
+            *self.init_flush_calls,
+            call(),
+        ]
+
+        # Set up test data and status.
+        cmd_queue = Queue()
+        cmd_queue.put((sw.INIT,))
+        cmd_queue.put((sw.PROG,))
+        cmd_queue.put((sw.END,))
+        title = self.title
+        stages = 6
+        maxlines = 2
+
+        # Run test.
+        _ = sw.status_writer(cmd_queue, title, stages, maxlines)
+
+        # Extract actual results.
+        act_write = mock_write.mock_calls
+        act_flush = mock_flush.mock_calls
+
+        # Determine if test passed.
+        self.assertListEqual(exp_write, act_write)
+        self.assertListEqual(exp_flush, act_flush)
+
+    @patch('statuswriter.statuswriter.write')
+    @patch('statuswriter.statuswriter.flush')
+    @patch('time.monotonic', return_value=1000)
+    def test_progress_burst_coalesced(self, _, mock_flush, mock_write):
+        """When several progress commands are waiting in the queue,
+        status_writer should fold them into a single repaint of the
+        progress bar.
+        """
+        # Expected value.
+        exp_write = [
+            *self.init_write_calls,
+            call('\0337' + '\033[A' * 4 + '\r' + '│███░░░│' + '\0338'),
         ]
         exp_flush = [
             *self.init_flush_calls,
@@ -304,6 +350,8 @@ class StatusWriter(ut.TestCase):
         cmd_queue = Queue()
         cmd_queue.put((sw.INIT,))
         cmd_queue.put((sw.PROG,))
+        cmd_queue.put((sw.PROG,))
+        cmd_queue.put((sw.PROG,))
         cmd_queue.put((sw.END,))
         title = self.title
         stages = 6
@@ -347,7 +395,8 @@ class StatusWriter(ut.TestCase):
 
 
 class TimerTestCase(ut.TestCase):
-    @patch('time.time', side_effect=[1000, 1050])
+    @patch('time.monotonic_ns', side_effect=[1_000_000_000_000,
+                                             1_050_000_000_000])
     def test_time_event(self, mock_time):
         """After initialization, timer should return the number of
         seconds since the timer was initialized.
@@ -359,7 +408,7 @@ class TimerTestCase(ut.TestCase):
         timer = sw.timer()
 
         # Run test.
-        act = next(timer)
+        act = timer()
 
         # Determine if test passed.
         self.assertEqual(exp, act)
@@ -369,28 +418,33 @@ class UpdateStatusTestCase(ut.TestCase):
     def setUp(self):
         self.TERMINAL_WIDTH_bkp = sw.TERMINAL_WIDTH
         sw.TERMINAL_WIDTH = 20
+        self._IS_TTY_bkp = sw._IS_TTY
+        sw._IS_TTY = True
 
     def tearDown(self):
         sw.TERMINAL_WIDTH = self.TERMINAL_WIDTH_bkp
+        sw._IS_TTY = self._IS_TTY_bkp
 
     @patch('statuswriter.statuswriter.write')
     def test_update(self, mock_write):
-        """Given an empty deque of status messages and a new message
-        not in the queue, add the new message to the deque, and write
-        the new message to the terminal.
+        """Given a ring of status messages and a new message, add the
+        new message to the ring, and write the new message to the
+        terminal.
         """
         # Expected value.
         exp = [
-            call('\r' + 'spam' + '\n'),
+            call('\r\033[A\033[J' + '\r' + 'spam' + '\n'),
         ]
-        exp_msgs = deque(['spam',])
+        exp_msgs = ['spam',]
+        exp_head = 0
 
         # Set up test data and state.
-        act_msgs = deque()
+        act_msgs = ['',]
+        head = 0
         new = 'spam'
 
         # Run test.
-        sw.update_status(act_msgs, new)
+        act_head = sw.update_status(act_msgs, head, new)
 
         # Extract test result.
         act = mock_write.mock_calls
@@ -398,40 +452,44 @@ class UpdateStatusTestCase(ut.TestCase):
         # Determine if test passed.
         self.assertListEqual(exp, act)
         self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
 
     @patch('statuswriter.statuswriter.write')
     def test_update_with_long_message_wrap(self, mock_write):
-        """Given a deque of status messages and a new message that is
+        """Given a ring of status messages and a new message that is
         longer than the given terminal width, write those messages to
         the terminal, wrapping the long message over several lines.
         """
         # Expected value.
         exp = [
-            call('\r\033[A' + '     '),
-            call('\r\033[A' + '    '),
-            call('\r' + 'bacon' + '\n'),
-            call('\r' + '01234567890123456789' + '\n'),
-            call('\r' + '0123456789' + '\n'),
+            call(
+                '\r' + '\033[A' * 3 + '\033[J'
+                + '\r' + 'bacon' + '\n'
+                + '\r' + '01234567890123456789' + '\n'
+                + '\r' + '0123456789' + '\n'
+            ),
         ]
-        exp_msgs = deque([
+        exp_msgs = [
+            '0123456789',
             'bacon',
             '01234567890123456789',
-            '0123456789',
-        ])
+        ]
+        exp_head = 1
 
         # Set up test data and state.
-        act_msgs = deque([
+        act_msgs = [
             'eggs',
             'bacon',
-        ])
+            '',
+        ]
         kwargs = {
             'msgs': act_msgs,
+            'head': 2,
             'new_msg': '012345678901234567890123456789',
-            'maxlines': 3,
         }
 
         # Run test.
-        sw.update_status(**kwargs)
+        act_head = sw.update_status(**kwargs)
 
         # Extract test result.
         act = mock_write.mock_calls
@@ -439,10 +497,11 @@ class UpdateStatusTestCase(ut.TestCase):
         # Determine if test passed.
         self.assertListEqual(exp, act)
         self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
 
     @patch('statuswriter.statuswriter.write')
     def test_update_with_hanging_indent_on_wrap(self, mock_write):
-        """Given a deque of status messages, a new message that is
+        """Given a ring of status messages, a new message that is
         longer than the given terminal width, and the size of the
         hanging indent for wrapped lines, write those messages to
         the terminal, wrapping the long message over several lines,
@@ -450,32 +509,72 @@ class UpdateStatusTestCase(ut.TestCase):
         """
         # Expected value.
         exp = [
-            call('\r\033[A' + '     '),
-            call('\r\033[A' + '    '),
-            call('\r' + 'bacon' + '\n'),
-            call('\r' + '01234567890123456789' + '\n'),
-            call('\r' + '    0123456789' + '\n'),
+            call(
+                '\r' + '\033[A' * 3 + '\033[J'
+                + '\r' + 'bacon' + '\n'
+                + '\r' + '01234567890123456789' + '\n'
+                + '\r' + '    0123456789' + '\n'
+            ),
         ]
-        exp_msgs = deque([
+        exp_msgs = [
+            '    0123456789',
             'bacon',
             '01234567890123456789',
-            '    0123456789',
-        ])
+        ]
+        exp_head = 1
 
         # Set up test data and state.
-        act_msgs = deque([
+        act_msgs = [
             'eggs',
             'bacon',
-        ])
+            '',
+        ]
         kwargs = {
             'msgs': act_msgs,
+            'head': 2,
             'new_msg': '012345678901234567890123456789',
-            'maxlines': 3,
             'hang_indent': 4,
         }
 
         # Run test.
-        sw.update_status(**kwargs)
+        act_head = sw.update_status(**kwargs)
+
+        # Extract test result.
+        act = mock_write.mock_calls
+
+        # Determine if test passed.
+        self.assertListEqual(exp, act)
+        self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
+
+    @patch('statuswriter.statuswriter.write')
+    def test_update_duplicate_is_noop(self, mock_write):
+        """Given a ring of status messages, a new message that
+        matches the newest message in the ring, and the dedupe flag,
+        update_status should return without writing to the terminal.
+        """
+        # Expected value.
+        exp = []
+        exp_msgs = [
+            'eggs',
+            'bacon',
+        ]
+        exp_head = 0
+
+        # Set up test data and state.
+        act_msgs = [
+            'eggs',
+            'bacon',
+        ]
+        kwargs = {
+            'msgs': act_msgs,
+            'head': 0,
+            'new_msg': 'bacon',
+            'dedupe': True,
+        }
+
+        # Run test.
+        act_head = sw.update_status(**kwargs)
 
         # Extract test result.
         act = mock_write.mock_calls
@@ -483,36 +582,112 @@ class UpdateStatusTestCase(ut.TestCase):
         # Determine if test passed.
         self.assertListEqual(exp, act)
         self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
+
+    @patch('statuswriter.statuswriter.write')
+    def test_update_with_overlay(self, mock_write):
+        """Given a ring of status messages, a new message, and the
+        overlay flag, write the display to the terminal as though the
+        new message had been added, but leave the ring unchanged.
+        """
+        # Expected value.
+        exp = [
+            call(
+                '\r' + '\033[A' * 2 + '\033[J'
+                + '\r' + 'bacon' + '\n'
+                + '\r' + 'spam' + '\n'
+            ),
+        ]
+        exp_msgs = [
+            'eggs',
+            'bacon',
+        ]
+        exp_head = 0
+
+        # Set up test data and state.
+        act_msgs = [
+            'eggs',
+            'bacon',
+        ]
+        kwargs = {
+            'msgs': act_msgs,
+            'head': 0,
+            'new_msg': 'spam',
+            'overlay': True,
+        }
+
+        # Run test.
+        act_head = sw.update_status(**kwargs)
+
+        # Extract test result.
+        act = mock_write.mock_calls
+
+        # Determine if test passed.
+        self.assertListEqual(exp, act)
+        self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
+
+    @patch('statuswriter.statuswriter.write')
+    def test_update_without_tty(self, mock_write):
+        """If stdout is not a terminal, update_status should write the
+        new message as a plain line without any cursor control codes.
+        """
+        # Expected value.
+        exp = [
+            call('spam' + '\n'),
+        ]
+        exp_msgs = ['spam',]
+        exp_head = 0
+
+        # Set up test data and state.
+        sw._IS_TTY = False
+        act_msgs = ['',]
+        head = 0
+        new = 'spam'
+
+        # Run test.
+        act_head = sw.update_status(act_msgs, head, new)
+
+        # Extract test result.
+        act = mock_write.mock_calls
+
+        # Determine if test passed.
+        self.assertListEqual(exp, act)
+        self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
 
     @patch('statuswriter.statuswriter.write')
     def test_update_with_old_messages(self, mock_write):
-        """Given a deque of status messages and a new message not yet
-        in the queue, write those messages to the terminal.
+        """Given a ring of status messages and a new message not yet
+        in the ring, write those messages to the terminal.
         """
         # Expected value.
         exp = [
-            call('\r\033[A' + '     '),
-            call('\r\033[A' + '    '),
-            call('\r' + 'eggs' + '\n'),
-            call('\r' + 'bacon' + '\n'),
-            call('\r' + 'spam' + '\n'),
+            call(
+                '\r' + '\033[A' * 3 + '\033[J'
+                + '\r' + 'eggs' + '\n'
+                + '\r' + 'bacon' + '\n'
+                + '\r' + 'spam' + '\n'
+            ),
         ]
-        exp_msgs = deque([
+        exp_msgs = [
             'eggs',
             'bacon',
             'spam',
-        ])
+        ]
+        exp_head = 0
 
         # Set up test data and state.
-        act_msgs = deque([
+        act_msgs = [
             'eggs',
             'bacon',
-        ])
+            '',
+        ]
+        head = 2
         new = 'spam'
-        maxlines = 3
 
         # Run test.
-        sw.update_status(act_msgs, new, maxlines)
+        act_head = sw.update_status(act_msgs, head, new)
 
         # Extract test result.
         act = mock_write.mock_calls
@@ -520,34 +695,37 @@ class UpdateStatusTestCase(ut.TestCase):
         # Determine if test passed.
         self.assertListEqual(exp, act)
         self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
 
     @patch('statuswriter.statuswriter.write')
     def test_update_with_roll_off(self, mock_write):
-        """Given a deque of status messages, write those messages to
-        the terminal.
+        """Given a full ring of status messages, write those messages
+        to the terminal, rolling the oldest message off the display.
         """
         # Expected value.
         exp = [
-            call('\r\033[A' + '     '),
-            call('\r\033[A' + '    '),
-            call('\r' + 'bacon' + '\n'),
-            call('\r' + 'spam' + '\n'),
+            call(
+                '\r' + '\033[A' * 2 + '\033[J'
+                + '\r' + 'bacon' + '\n'
+                + '\r' + 'spam' + '\n'
+            ),
         ]
-        exp_msgs = deque([
-            'bacon',
+        exp_msgs = [
             'spam',
-        ])
+            'bacon',
+        ]
+        exp_head = 1
 
         # Set up test data and state.
-        act_msgs = deque([
+        act_msgs = [
             'eggs',
             'bacon',
-        ])
+        ]
+        head = 0
         new = 'spam'
-        maxlines = 2
 
         # Run test.
-        sw.update_status(act_msgs, new, maxlines)
+        act_head = sw.update_status(act_msgs, head, new)
 
         # Extract test result.
         act = mock_write.mock_calls
@@ -555,9 +733,17 @@ class UpdateStatusTestCase(ut.TestCase):
         # Determine if test passed.
         self.assertListEqual(exp, act)
         self.assertEqual(exp_msgs, act_msgs)
+        self.assertEqual(exp_head, act_head)
 
 
 class UpdateProgressTestCase(ut.TestCase):
+    def setUp(self):
+        self._IS_TTY_bkp = sw._IS_TTY
+        sw._IS_TTY = True
+
+    def tearDown(self):
+        sw._IS_TTY = self._IS_TTY_bkp
+
     @patch('statuswriter.statuswriter.write')
     def test_update(self, mock_write):
         """Given the total number of steps and the number of completed
@@ -581,6 +767,31 @@ class UpdateProgressTestCase(ut.TestCase):
         # Determine if test passed.
         self.assertListEqual(exp, act)
 
+    @patch('statuswriter.statuswriter.write')
+    def test_update_without_tty(self, mock_write):
+        """If stdout is not a terminal, update_progress should write
+        the bar as a plain line without any cursor control codes.
+        """
+        # Expected value.
+        exp = [
+            call('│██░░░░│' + '\n'),
+        ]
+
+        # Set up test data and state.
+        sw._IS_TTY = False
+        total = 6
+        complete = 2
+        lines = 2
+
+        # Run test.
+        sw.update_progress(total, complete, lines)
+
+        # Extract actual result.
+        act = mock_write.mock_calls
+
+        # Determine if test passed.
+        self.assertListEqual(exp, act)
+
     @patch('statuswriter.statuswriter.write')
     def test_update_with_lines(self, mock_write):
         """Given the total number of steps, the number of completed
@@ -589,9 +800,7 @@ class UpdateProgressTestCase(ut.TestCase):
         """
         # Expected value.
         exp = [
-            call('\033[A' * 4 + '\r'),
-            call('│██░░░░│'),
-            call('\n' * 4 + '\r'),
+            call('\0337' + '\033[A' * 4 + '\r' + '│██░░░░│' + '\0338'),
         ]
 
         # Set up test data and state.